@@ -3,24 +3,22 @@
 Script to update grid snapping functions to account for grid offsets.
 """
 
-import re
-
 # Read the file
 file_path = "D:/Projects/VTT/apps/web/src/lib/components/SceneCanvas.svelte"
 with open(file_path, 'r', encoding='utf-8') as f:
     content = f.read()
 
-# Pattern for snapToGrid function
-snap_to_grid_pattern = r'''  function snapToGrid\(x: number, y: number\): \{ x: number; y: number \} \{
-    if \(!gridSnap\) return \{ x, y \};
-    const gridSize = scene\.gridSize \?\? 100;
-    const cellWidth = scene\.gridWidth \?\? gridSize;
-    const cellHeight = scene\.gridHeight \?\? gridSize;
-    return \{
-      x: Math\.round\(x / cellWidth\) \* cellWidth,
-      y: Math\.round\(y / cellHeight\) \* cellHeight,
-    \};
-  \}'''
+# Original snapToGrid function
+snap_to_grid_original = '''  function snapToGrid(x: number, y: number): { x: number; y: number } {
+    if (!gridSnap) return { x, y };
+    const gridSize = scene.gridSize ?? 100;
+    const cellWidth = scene.gridWidth ?? gridSize;
+    const cellHeight = scene.gridHeight ?? gridSize;
+    return {
+      x: Math.round(x / cellWidth) * cellWidth,
+      y: Math.round(y / cellHeight) * cellHeight,
+    };
+  }'''
 
 snap_to_grid_replacement = '''  function snapToGrid(x: number, y: number): { x: number; y: number } {
     if (!gridSnap) return { x, y };
@@ -35,17 +33,17 @@ snap_to_grid_replacement = '''  function snapToGrid(x: number, y: number): { x:
     };
   }'''
 
-# Pattern for snapToGridCenter function
-snap_to_grid_center_pattern = r'''  function snapToGridCenter\(x: number, y: number\): \{ x: number; y: number \} \{
-    const gridSize = scene\.gridSize \?\? 100;
-    const cellWidth = scene\.gridWidth \?\? gridSize;
-    const cellHeight = scene\.gridHeight \?\? gridSize;
-    // Snap to center of cell \(add half grid size after rounding to corner\)
-    return \{
-      x: Math\.floor\(x / cellWidth\) \* cellWidth \+ cellWidth / 2,
-      y: Math\.floor\(y / cellHeight\) \* cellHeight \+ cellHeight / 2,
-    \};
-  \}'''
+# Original snapToGridCenter function
+snap_to_grid_center_original = '''  function snapToGridCenter(x: number, y: number): { x: number; y: number } {
+    const gridSize = scene.gridSize ?? 100;
+    const cellWidth = scene.gridWidth ?? gridSize;
+    const cellHeight = scene.gridHeight ?? gridSize;
+    // Snap to center of cell (add half grid size after rounding to corner)
+    return {
+      x: Math.floor(x / cellWidth) * cellWidth + cellWidth / 2,
+      y: Math.floor(y / cellHeight) * cellHeight + cellHeight / 2,
+    };
+  }'''
 
 snap_to_grid_center_replacement = '''  function snapToGridCenter(x: number, y: number): { x: number; y: number } {
     const gridSize = scene.gridSize ?? 100;
@@ -60,13 +58,12 @@ snap_to_grid_center_replacement = '''  function snapToGridCenter(x: number, y: n
     };
   }'''
 
-# Apply replacements
-content_updated = re.sub(snap_to_grid_pattern, snap_to_grid_replacement, content)
-content_updated = re.sub(snap_to_grid_center_pattern, snap_to_grid_center_replacement, content_updated)
+# Apply both replacements (literal text, so no regex escaping is needed)
+content_updated = content.replace(snap_to_grid_original, snap_to_grid_replacement).replace(snap_to_grid_center_original, snap_to_grid_center_replacement)
 
 # Check if changes were made
 if content_updated == content:
-    print("ERROR: No changes were made. Patterns may not match.")
+    print("ERROR: No changes were made. Original functions may not match.")
     # Try to find the functions
     if 'function snapToGrid' in content:
         print("Found snapToGrid function")
@@ -4,128 +4,228 @@ Fix ESM imports by adding .js extensions to all relative imports.
 This script processes TypeScript files and adds .js extensions where needed.
 """
 
+import hashlib
+import json
 import os
 import re
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+# Generated/vendored directories that never contain sources to rewrite
+# (hidden directories such as .git and .turbo are skipped as well)
+SKIP_DIRS = {'node_modules', 'dist', 'build', '__generated__'}
+
+# Sidecar file (next to this script) recording the stat of files already processed
+CACHE_FILE_NAME = '.esm_fixer_cache.json'
+
+# Below this many pending files, worker start-up costs more than it saves
+PARALLEL_MIN_FILES = 500
+
+# Match import/export statements with relative paths in a single pass:
+#   static:      import ... from './path' or export ... from './path'
+#   side-effect: import './path'
+#   dynamic:     import('./path')
+# All forms share one leading keyword so the engine can scan for it quickly; the
+# dynamic form is marked by the 'dyn' group, which also requires the closing ')'.
+# The closing quote is a backreference and brace lists are capped to bound backtracking.
+# Files are processed as bytes, so the pattern is a bytes pattern too; identifiers
+# use [\w$\x80-\xff] because bytes \w is ASCII-only (UTF-8 names, $-prefixed names).
+_IMPORT_RE = re.compile(
+    rb"(?P<prefix>(?:import|export)(?:\s+(?:(?:type\s+)?(?:\{[^}]{0,4096}\}|[*](?:\s+as\s+[\w$\x80-\xff]+)?|[\w$\x80-\xff]+)\s+from\s+)?|(?P<dyn>\()))"
+    rb"(?P<quote>['\"])(?P<path>\.{1,2}/[^'\"]+)(?P=quote)(?(dyn)\))"
+)
 
 def needs_js_extension(import_path: str) -> bool:
     """Check if an import path needs a .js extension."""
-    # Already has .js extension
-    if import_path.endswith('.js'):
+    # Already has .js extension, or is a non-module asset
+    if import_path.endswith(('.js', '.json', '.css', '.svg')):
         return False
 
     # Not a relative import
-    if not (import_path.startswith('./') or import_path.startswith('../')):
+    if not import_path.startswith(('./', '../')):
         return False
 
     return True
 
-def add_js_extension(import_path: str, file_dir: Path, source_root: Path) -> str:
-    """Add .js extension to import path, handling both files and directories."""
+@lru_cache(maxsize=None)
+def is_index_directory(resolved_path: str) -> bool:
+    """Check if a resolved path is a directory containing index.ts (cached per process)."""
+    return os.path.isdir(resolved_path) and os.path.isfile(os.path.join(resolved_path, 'index.ts'))
+
+@lru_cache(maxsize=None)
+def add_js_extension(import_path: str, file_dir: str, source_root: Path) -> str:
+    """
+    Add .js extension to import path, handling both files and directories.
+    Results are cached per (import_path, file_dir), since sibling files share specifiers.
+    """
     if not needs_js_extension(import_path):
         return import_path
 
-    # Resolve the absolute path of the imported module
-    resolved_path = (file_dir / import_path).resolve()
+    # Normalize the path of the imported module (pure string ops, no getcwd/stat)
+    resolved_path = os.path.normpath(os.path.join(file_dir, import_path))
 
-    # Check if it's a directory (would need /index.js)
-    if resolved_path.is_dir():
-        # Check if index.ts exists
-        index_ts = resolved_path / 'index.ts'
-        if index_ts.exists():
-            if import_path.endswith('/index'):
-                return f'{import_path}.js'
-            else:
-                return f'{import_path}/index.js'
+    # Check if it's a directory with index.ts (would need /index.js)
+    if is_index_directory(resolved_path):
+        if import_path.endswith('/index'):
+            return f'{import_path}.js'
+        else:
+            return f'{import_path}/index.js'
 
     # Otherwise, just add .js
     return f'{import_path}.js'
 
-def fix_imports_in_file(file_path: Path, source_root: Path) -> Tuple[bool, int]:
+def fix_imports_in_file(file_path: str, source_root: Path) -> Tuple[bool, int]:
     """
     Fix imports in a single file.
-    Returns (was_modified, num_changes).
+    Returns (was_modified, num_changes); num_changes is -1 if the file could not be read or written.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(file_path, 'rb') as f:
             content = f.read()
     except Exception as e:
         print(f'Error reading {file_path}: {e}')
+        return False, -1
+
+    # Fast reject: every match needs a './' or '../' specifier
+    if b'./' not in content:
         return False, 0
 
-    original_content = content
     changes = 0
-    file_dir = file_path.parent
-
-    # Pattern to match import/export statements with relative paths
-    # Matches: import ... from './path'
-    #          export ... from './path'
-    #          import('./path')
-
-    # Pattern 1: import/export ... from './path' or "../path"
-    def replace_import_export(match):
-        nonlocal changes
-        prefix = match.group(1)  # import/export statement
-        quote = match.group(2)   # ' or "
-        path = match.group(3)    # the import path
-
+    file_dir = os.path.dirname(file_path)
+
+    # Rebuild the content from fragments, joined once at the end
+    parts = []
+    last_end = 0
+    for match in _IMPORT_RE.finditer(content):
+        path = match.group('path')
+        prefix = match.group('prefix')
+        quote = match.group('quote')
+        # dynamic import('./path') also consumed the closing ')'
+        suffix = b')' if match.group('dyn') else b''
+
+        # Only the specifier is decoded; surrogateescape round-trips any non-UTF-8 bytes
+        path = path.decode('utf-8', 'surrogateescape')
         if needs_js_extension(path):
             new_path = add_js_extension(path, file_dir, source_root)
             changes += 1
-            return f'{prefix}{quote}{new_path}{quote}'
-        return match.group(0)
-
-    # Match: import ... from './path' or export ... from './path'
-    pattern1 = r"((?:import|export)(?:\s+(?:type\s+)?(?:\{[^}]+\}|[*]|\w+))?(?:\s+(?:from|as))?\s+)(['\"])(\.\./[^'\"]+|\.\/[^'\"]+)(['\"])"
-    content = re.sub(pattern1, replace_import_export, content)
-
-    # Pattern 2: dynamic import('./path')
-    def replace_dynamic_import(match):
-        nonlocal changes
-        quote = match.group(1)
-        path = match.group(2)
-
-        if needs_js_extension(path):
-            new_path = add_js_extension(path, file_dir, source_root)
-            changes += 1
-            return f"import({quote}{new_path}{quote})"
-        return match.group(0)
-
-    pattern2 = r"import\((['\"])(\.\./[^'\"]+|\.\/[^'\"]+)(['\"])\)"
-    content = re.sub(pattern2, replace_dynamic_import, content)
+            parts.append(content[last_end:match.start()])
+            parts.append(prefix + quote + new_path.encode('utf-8', 'surrogateescape') + quote + suffix)
+            last_end = match.end()
 
     # Only write if content changed
-    if content != original_content:
+    if changes:
+        parts.append(content[last_end:])
+        content = b''.join(parts)
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
+            with open(file_path, 'wb') as f:
                 f.write(content)
             return True, changes
         except Exception as e:
             print(f'Error writing {file_path}: {e}')
-            return False, 0
+            return False, -1
 
     return False, 0
 
-def fix_imports_in_directory(directory: Path) -> Tuple[int, int]:
+def script_version() -> str:
+    """Hash of this script's source, so cached results are dropped whenever the rewrite logic changes."""
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+def load_cache(cache_path: Path, version: str) -> Dict[str, List[int]]:
+    """
+    Load the path -> [mtime_ns, size] cache.
+    Returns an empty cache if the file is missing, invalid, or written by another script version.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get('version') != version:
+        return {}
+    return data.get('files', {})
+
+def save_cache(cache_path: Path, version: str, cache: Dict[str, List[int]]) -> None:
+    """Persist the path -> [mtime_ns, size] cache along with the script version."""
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'files': cache}, f)
+    except OSError as e:
+        print(f'Error writing {cache_path}: {e}')
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Create the worker pool shared by all directories on first use (the import alone is ~40ms)."""
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor()
+
+def fix_imports_in_directory(directory: Path, cache: Optional[Dict[str, List[int]]] = None) -> Tuple[int, int]:
     """
     Fix imports in all TypeScript files in a directory.
+    Files whose mtime and size match the cache are skipped; the cache is updated in place.
+    Large batches are fanned out over the shared worker pool, small ones run serially.
     Returns (files_modified, total_changes).
     """
+    if cache is None:
+        cache = {}
     files_modified = 0
     total_changes = 0
 
-    # Find all .ts files
-    ts_files = list(directory.rglob('*.ts'))
+    # Find all .ts files (os.walk uses scandir and avoids building Path objects).
+    # Declaration files are skipped since they are not emitted as JS.
+    ts_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+        ts_files.extend(
+            os.path.join(root, name)
+            for name in files
+            if name.endswith('.ts') and not name.endswith('.d.ts')
+        )
+
+    # Forget files under this directory that were deleted or are no longer walked
+    walked = set(ts_files)
+    root_prefix = os.path.join(directory, '')
+    for stale in [path for path in cache if path.startswith(root_prefix) and path not in walked]:
+        del cache[stale]
+
+    # Skip files that have not changed since they were last processed
+    pending = []
+    for file_path in ts_files:
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            # e.g. a dangling symlink; keep it pending so it is never skipped
+            print(f'Error reading {file_path}: {e}')
+            pending.append(file_path)
+            continue
+        if cache.get(file_path) != [st.st_mtime_ns, st.st_size]:
+            pending.append(file_path)
 
-    print(f'\nProcessing {len(ts_files)} TypeScript files in {directory}...')
+    print(f'\nProcessing {len(pending)} TypeScript files in {directory} '
+          f'({len(ts_files) - len(pending)} unchanged since last run)...')
+
+    # Files are independent, so large batches are fanned out across worker processes
+    if len(pending) >= PARALLEL_MIN_FILES:
+        results = get_executor().map(fix_imports_in_file, pending, repeat(directory), chunksize=32)
+    else:
+        results = map(fix_imports_in_file, pending, repeat(directory))
+
+    for file_path, (was_modified, num_changes) in zip(pending, results):
+        if num_changes < 0:
+            continue
+
+        try:
+            st = os.stat(file_path)
+            cache[file_path] = [st.st_mtime_ns, st.st_size]
+        except OSError as e:
+            print(f'Error reading {file_path}: {e}')
 
-    for file_path in ts_files:
-        was_modified, num_changes = fix_imports_in_file(file_path, directory)
         if was_modified:
             files_modified += 1
             total_changes += num_changes
-            rel_path = file_path.relative_to(directory)
+            rel_path = os.path.relpath(file_path, directory)
             print(f'  [OK] {rel_path} ({num_changes} changes)')
 
     return files_modified, total_changes
@@ -133,8 +233,11 @@ def fix_imports_in_directory(directory: Path) -> Tuple[int, int]:
 def main():
     """Main entry point."""
     # Get the VTT project root
-    script_dir = Path(__file__).parent
+    script_dir = Path(__file__).resolve().parent
     vtt_root = script_dir.parent.parent
+    cache_path = script_dir / CACHE_FILE_NAME
+    version = script_version()
+    cache = load_cache(cache_path, version)
 
     print('=' * 70)
     print('ESM Import Fixer - Adding .js extensions to relative imports')
@@ -155,10 +258,20 @@ def main():
             print(f'\n[WARNING] Directory not found: {directory}')
             continue
 
-        files_modified, changes = fix_imports_in_directory(directory)
+        files_modified, changes = fix_imports_in_directory(directory, cache)
         total_files += files_modified
         total_changes += changes
 
+    # Shut down the worker pool if any directory needed it
+    if get_executor.cache_info().currsize:
+        get_executor().shutdown()
+
+    # Forget files outside the directories that were processed
+    roots = tuple(os.path.join(directory, '') for directory in directories if directory.exists())
+    cache = {path: entry for path, entry in cache.items() if path.startswith(roots)}
+
+    save_cache(cache_path, version, cache)
+
     print('\n' + '=' * 70)
     print(f'Summary:')
     print(f'  Files modified: {total_files}')